@@ -71,23 +71,32 @@ def load_csv(csv_path):
     return rows
 
 
-def avg_per_iteration(rows, field):
-    """Compute average of `field` across all queries, per iteration."""
-    by_iter = defaultdict(list)
+# Metrics averaged per iteration (one figure panel each)
+METRIC_FIELDS = ("avg_qerror", "plan_time_ms", "exec_time_ms")
+
+
+def avg_per_iteration(rows, fields=METRIC_FIELDS):
+    """
+    Compute average of each of `fields` across all queries, per iteration.
+    Returns {field: (iters, avgs)} — computed once per series and shared by
+    the summary and every figure.
+    """
+    by_iter = defaultdict(lambda: defaultdict(list))
     for r in rows:
-        by_iter[r["iteration"]].append(r[field])
+        bucket = by_iter[r["iteration"]]
+        for field in fields:
+            bucket[field].append(r[field])
     iters = sorted(by_iter.keys())
-    avgs = [mean(by_iter[i]) for i in iters]
-    return iters, avgs
+    return {field: (iters, [mean(by_iter[i][field]) for i in iters]) for field in fields}
 
 
 def plot_metric(ax, loaded_series, field, ylabel, title):
     """
     Plot one metric with all available series.
-    loaded_series: list of (style_dict, rows)
+    loaded_series: list of (style_dict, per_iteration_avgs)
     """
-    for style, rows in loaded_series:
-        iters, vals = avg_per_iteration(rows, field)
+    for style, avgs in loaded_series:
+        iters, vals = avgs[field]
         ax.plot(iters, vals,
                 marker=style["marker"],
                 color=style["color"],
@@ -104,7 +113,7 @@ def plot_metric(ax, loaded_series, field, ylabel, title):
     ax.grid(True, alpha=0.3)
     # x-ticks from the first series (all share same iteration count)
     if loaded_series:
-        iters, _ = avg_per_iteration(loaded_series[0][1], field)
+        iters, _ = loaded_series[0][1][field]
         ax.set_xticks(iters)
 
 
@@ -112,23 +121,23 @@ def print_summary(loaded_series, bench_name):
     print(f"\n{'═'*60}")
     print(f"  Analysis: {bench_name}")
     print(f"{'═'*60}")
-    for style, rows in loaded_series:
-        _, qerr  = avg_per_iteration(rows, "avg_qerror")
-        _, plan  = avg_per_iteration(rows, "plan_time_ms")
-        _, exec_ = avg_per_iteration(rows, "exec_time_ms")
+    for style, avgs in loaded_series:
+        _, qerr  = avgs["avg_qerror"]
+        _, plan  = avgs["plan_time_ms"]
+        _, exec_ = avgs["exec_time_ms"]
         label = style["label"]
         print(f"  {label:<30} Q-err: {mean(qerr):>6.2f}  "
               f"Plan: {mean(plan):>7.2f}ms  Exec: {mean(exec_):>9.2f}ms")
 
     # Speedup vs no_aqo baseline
-    no_aqo_rows = next((r for s, r in loaded_series if s["mode"] == "no_aqo"), None)
-    if no_aqo_rows:
-        _, base_exec = avg_per_iteration(no_aqo_rows, "exec_time_ms")
+    no_aqo_avgs = next((a for s, a in loaded_series if s["mode"] == "no_aqo"), None)
+    if no_aqo_avgs:
+        _, base_exec = no_aqo_avgs["exec_time_ms"]
         base_mean = mean(base_exec)
-        for style, rows in loaded_series:
+        for style, avgs in loaded_series:
             if style["mode"] == "no_aqo":
                 continue
-            _, exec_ = avg_per_iteration(rows, "exec_time_ms")
+            _, exec_ = avgs["exec_time_ms"]
             speedup = base_mean / mean(exec_) if mean(exec_) > 0 else float("inf")
             sign = "↑" if speedup >= 1.0 else "↓"
             print(f"  {style['label']:<30} Exec speedup vs no_aqo: {speedup:.2f}× {sign}")
@@ -150,7 +159,7 @@ def main():
         csv_path = os.path.join(results_dir, f"{style['mode']}_results.csv")
         if os.path.exists(csv_path):
             rows = load_csv(csv_path)
-            loaded_series.append((style, rows))
+            loaded_series.append((style, avg_per_iteration(rows)))
             print(f"  Loaded: {style['mode']} ({len(rows)} rows)")
         else:
             print(f"  Skip  : {style['mode']} (not found: {csv_path})")
@@ -43,6 +43,7 @@ import sys
 from pathlib import Path
 
 PSQL = os.environ.get("PSQL", "sudo -u postgres /usr/local/pgsql/bin/psql")
+PSQL_ARGS = PSQL.split()  # resolved once; every query reuses it
 AQO_JOIN_THRESHOLD = int(os.environ.get("AQO_JOIN_THRESHOLD", "0"))
 SWITCH_AQO_SKIP = os.environ.get("SWITCH_AQO_SKIP", "0") == "1"
 
@@ -59,16 +60,14 @@ ALL_MODES = ["no_aqo", "standard_aqo", "semantic_aqo"]
 
 def run_psql(db, sql):
     """Execute SQL via psql, return stdout."""
-    parts = PSQL.split()
-    cmd = parts + ["-d", db, "-t", "-A", "-c", sql]
+    cmd = PSQL_ARGS + ["-d", db, "-t", "-A", "-c", sql]
     result = subprocess.run(cmd, capture_output=True, text=True)
     return result.returncode, result.stdout, result.stderr
 
 
 def run_psql_file(db, filepath):
     """Execute a SQL file via psql, return stdout."""
-    parts = PSQL.split()
-    cmd = parts + ["-d", db, "-t", "-A", "-f", filepath]
+    cmd = PSQL_ARGS + ["-d", db, "-t", "-A", "-f", filepath]
     result = subprocess.run(cmd, capture_output=True, text=True)
     return result.returncode, result.stdout, result.stderr
 
@@ -102,9 +101,14 @@ def switch_aqo_variant(variant):
     return True
 
 
-def extract_qerrors(node):
-    """Walk the JSON plan tree, collect Q-errors for each node."""
-    qerrors = []
+def extract_qerrors(node, qerrors=None):
+    """Walk the JSON plan tree, collect Q-errors for each node.
+
+    All nodes append into one shared list, so the walk is a single pass with
+    no per-level list copies.
+    """
+    if qerrors is None:
+        qerrors = []
     est = node.get("Plan Rows", 0)
     act = node.get("Actual Rows", 0)
     if est > 0 and act > 0:
@@ -114,7 +118,7 @@ def extract_qerrors(node):
     else:
         qerrors.append(max(est, act, 1))
     for child in node.get("Plans", []):
-        qerrors.extend(extract_qerrors(child))
+        extract_qerrors(child, qerrors)
     return qerrors
 
 
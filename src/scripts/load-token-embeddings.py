@@ -5,10 +5,15 @@ Load token embeddings from sense_embeddings.bin into PostgreSQL table `token_emb
 Binary format of sense_embeddings.bin:
   Header:  int32(num_tokens) | int32(vec_dim)
   Records: int32(token_len) | char[token_len] | float32[vec_dim]
+
+Rows are streamed to the server as a single `COPY ... FROM STDIN (FORMAT binary)`,
+so the whole load is one statement instead of one INSERT per batch.
 """
 
 import configparser
+import mmap
 import os
+import re
 import struct
 import subprocess
 import sys
@@ -16,6 +21,16 @@ import sys
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_PATH = os.path.join(SCRIPT_DIR, '..', 'config', 'db.conf')
 
+# Per-record token length prefix in sense_embeddings.bin
+TOKEN_LEN = struct.Struct('<I')
+
+# PostgreSQL binary COPY framing (see "COPY ... Binary Format" in the PG docs)
+COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+COPY_ROW_HEADER = struct.Struct('>hi')  # field count | token length
+COPY_TRAILER = struct.pack('>h', -1)
+COPY_CHUNK_BYTES = 4 << 20
+FLOAT4OID = 700
+
 
 def load_config():
     config = configparser.ConfigParser()
@@ -31,24 +46,39 @@ def load_config():
     }
 
 
-def parse_embeddings(bin_path):
-    """Parse sense_embeddings.bin and yield (token, embedding_list) tuples."""
+def read_header(bin_path):
+    """Return (num_tokens, vec_dim) from the sense_embeddings.bin header."""
     with open(bin_path, 'rb') as f:
-        data = f.read()
+        return struct.unpack('<ii', f.read(8))
 
-    num_tokens, vec_dim = struct.unpack_from('<ii', data, 0)
-    offset = 8
 
-    for _ in range(num_tokens):
-        tok_len = struct.unpack_from('<I', data, offset)[0]
-        offset += 4
-        token = data[offset:offset + tok_len].decode('utf-8')
-        offset += tok_len
-        embedding = list(struct.unpack_from(f'<{vec_dim}f', data, offset))
-        offset += vec_dim * 4
-        yield token, embedding
-
-    assert offset == len(data), f"Parse error: offset {offset} != file size {len(data)}"
+def parse_embeddings(bin_path):
+    """Stream sense_embeddings.bin and yield (token_bytes, embedding_bytes) tuples.
+
+    Both fields are passed through undecoded: token_bytes is the UTF-8 token as
+    stored in the file (the server validates the encoding on COPY), and
+    embedding_bytes is the raw little-endian float32[vec_dim] payload, which
+    encode_copy_binary re-encodes in bulk rather than float by float.
+    The file is memory-mapped, so each record costs one unpack and two slices
+    and the kernel page cache, not the heap, holds the data.
+    """
+    with open(bin_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        num_tokens, vec_dim = struct.unpack_from('<ii', data, 0)
+        vec_bytes = vec_dim * 4
+        offset = 8
+
+        for _ in range(num_tokens):
+            tok_len = TOKEN_LEN.unpack_from(data, offset)[0]
+            offset += 4
+            token = data[offset:offset + tok_len]
+            offset += tok_len
+            embedding = data[offset:offset + vec_bytes]
+            offset += vec_bytes
+            assert len(embedding) == vec_bytes, f"Parse error: truncated record for {token!r}"
+            yield token, embedding
+
+        size = len(data)
+    assert offset == size, f"Parse error: offset {offset} != file size {size}"
 
 
 def build_psql_env(cfg):
@@ -80,58 +110,119 @@ def run_sql(cfg, sql):
     return result.stdout
 
 
+def copy_from_stdin(cfg, statements, chunks):
+    """Execute `statements` (one of them a `COPY ... FROM STDIN`) as a single
+    transaction via psql, streaming the byte `chunks` as the COPY input."""
+    env, args = build_psql_env(cfg)
+    args.append('--single-transaction')
+    for sql in statements:
+        args += ['-c', sql]
+    proc = subprocess.Popen(args, env=env, stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        for chunk in chunks:
+            proc.stdin.write(chunk)
+    except BrokenPipeError:
+        pass  # psql exited early; its stderr says why
+    except BaseException:
+        # The input failed mid-stream (e.g. a parse error). Closing stdin would
+        # let psql end the COPY normally and commit the rows sent so far, so
+        # kill it instead: the dropped connection aborts the whole transaction.
+        proc.kill()
+        proc.wait()
+        raise
+    stdout, stderr = proc.communicate()
+    if proc.returncode != 0:
+        print(f"COPY error:\n{stderr.decode(errors='replace')}", file=sys.stderr)
+        sys.exit(1)
+    return stdout.decode()
+
+
+def encode_copy_binary(records, vec_dim, chunk_bytes=COPY_CHUNK_BYTES):
+    """Encode (token_bytes, embedding_bytes) records as a binary COPY stream for
+    (token, embedding), yielding it in chunks of roughly `chunk_bytes`."""
+    # real[] wire format: ndim | has-null flag | element oid | dim size | lower bound,
+    # followed by one length-prefixed big-endian float4 per element
+    array_header = struct.pack('>iiiIii', 20 + 8 * vec_dim, 1, 0, FLOAT4OID, vec_dim, 1)
+    # Element template: every 8-byte slot is int32(4) | float4; the length
+    # prefixes never change, so only the float bytes are overwritten per row
+    elems = bytearray(8 * vec_dim)
+    elems[3::8] = b'\x04' * vec_dim
+
+    buf = bytearray(COPY_SIGNATURE)
+    buf += struct.pack('>ii', 0, 0)  # flags, header extension length
+    row_header = COPY_ROW_HEADER.pack
+    for tok, emb in records:
+        buf += row_header(2, len(tok))
+        buf += tok
+        buf += array_header
+        # Strided copies byte-swap little-endian float32 into big-endian in C
+        for k in range(4):
+            elems[4 + k::8] = emb[3 - k::4]
+        buf += elems
+        if len(buf) >= chunk_bytes:
+            yield bytes(buf)
+            buf.clear()
+    buf += COPY_TRAILER
+    yield bytes(buf)
+
+
 def create_table(cfg):
-    """Truncate token_embeddings table if it exists and belongs to the aqo extension,
-    or create it standalone if the extension is not installed."""
+    """Return (pre_copy, post_copy) SQL statements that prepare token_embeddings
+    for the load transaction.
+
+    If the table exists (owned by the aqo extension) it is truncated, keeping
+    its schema and indexes; otherwise it is created standalone, with its
+    PRIMARY KEY / UNIQUE indexes added after the COPY so each index is built
+    once over the loaded rows.
+    """
     # Check if table already exists (owned by extension or standalone)
-    check_sql = "SELECT COUNT(*) FROM information_schema.tables WHERE table_name='token_embeddings' AND table_schema='public';"
+    check_sql = "SELECT to_regclass('public.token_embeddings') IS NOT NULL;"
     env, args = build_psql_env(cfg)
-    result = subprocess.run(args + ['-t', '-c', check_sql], env=env, capture_output=True, text=True)
-    table_exists = result.returncode == 0 and result.stdout.strip() == '1'
+    result = subprocess.run(args + ['-t', '-A', '-c', check_sql], env=env, capture_output=True, text=True)
+    table_exists = result.returncode == 0 and result.stdout.strip() == 't'
 
     if table_exists:
-        # Table exists (likely owned by aqo extension) — just truncate it
-        print("Truncating existing token_embeddings table...")
-        run_sql(cfg, "TRUNCATE token_embeddings;")
-    else:
-        # Standalone table creation (no extension)
-        print("Creating table token_embeddings...")
-        ddl = """
+        # Table exists (likely owned by aqo extension) — just truncate it,
+        # restarting the id sequence so a re-load yields the same ids as a fresh one
+        print("Existing token_embeddings table will be truncated...")
+        return ["TRUNCATE token_embeddings RESTART IDENTITY;"], []
+
+    # Standalone table creation (no extension)
+    print("Table token_embeddings will be created...")
+    ddl = """
 CREATE TABLE token_embeddings (
-    id          SERIAL PRIMARY KEY,
-    token       TEXT NOT NULL UNIQUE,
+    id          SERIAL,
+    token       TEXT NOT NULL,
     embedding   REAL[] NOT NULL
 );
 """
-        run_sql(cfg, ddl)
-    print("  Done.")
-
-
-def load_embeddings(cfg, bin_path):
-    """Insert all embeddings from the binary file into the table."""
-    print(f"Parsing {bin_path}...")
-    records = list(parse_embeddings(bin_path))
-    print(f"  Found {len(records)} tokens.")
-
-    # Build a single multi-row INSERT for efficiency
-    BATCH_SIZE = 100
-    total = 0
-    for batch_start in range(0, len(records), BATCH_SIZE):
-        batch = records[batch_start:batch_start + BATCH_SIZE]
-        values_parts = []
-        for token, emb in batch:
-            # Escape single quotes in token
-            safe_token = token.replace("'", "''")
-            arr_literal = "ARRAY[" + ",".join(f"{v}" for v in emb) + "]::real[]"
-            values_parts.append(f"('{safe_token}', {arr_literal})")
-
-        sql = "INSERT INTO token_embeddings (token, embedding) VALUES\n" + \
-              ",\n".join(values_parts) + ";"
-        run_sql(cfg, sql)
-        total += len(batch)
-        print(f"  Inserted {total}/{len(records)} rows...")
-
-    print(f"Load complete: {total} rows inserted.")
+    constraints = "ALTER TABLE token_embeddings ADD PRIMARY KEY (id), ADD UNIQUE (token);"
+    return [ddl], [constraints]
+
+
+def load_embeddings(cfg, bin_path, pre_copy, post_copy):
+    """Load all embeddings from the binary file into the table with one binary COPY."""
+    num_tokens, vec_dim = read_header(bin_path)
+    print(f"Streaming {num_tokens} tokens (dim {vec_dim}) from {bin_path} via COPY...")
+    # Table setup, COPY and index builds share one transaction: a failed load
+    # leaves the previous state in place, and there is a single commit (fsync).
+    # synchronous_commit is relaxed for it — a crash mid-load just means re-running.
+    # The row-count guard matters because the input is streamed: if this process
+    # dies mid-stream, psql sees a clean EOF and would otherwise commit the rows
+    # received so far; instead the guard fails and ON_ERROR_STOP rolls back.
+    out = copy_from_stdin(cfg, [
+        "SET LOCAL synchronous_commit = off;",
+        *pre_copy,
+        "COPY token_embeddings (token, embedding) FROM STDIN WITH (FORMAT binary);",
+        "DO $$BEGIN "
+        f"IF (SELECT count(*) FROM token_embeddings) <> {num_tokens} THEN "
+        f"RAISE EXCEPTION 'short load: expected {num_tokens} rows'; "
+        "END IF; END$$;",
+        *post_copy,
+    ], encode_copy_binary(parse_embeddings(bin_path), vec_dim))
+    copied = re.search(r'^COPY (\d+)$', out, re.MULTILINE)
+    print(f"Load complete: {copied.group(1) if copied else num_tokens} rows copied.")
 
 
 def verify(cfg):
@@ -155,8 +246,8 @@ def main():
         print(f"Embeddings file not found: {bin_path}", file=sys.stderr)
         sys.exit(1)
 
-    create_table(cfg)
-    load_embeddings(cfg, bin_path)
+    pre_copy, post_copy = create_table(cfg)
+    load_embeddings(cfg, bin_path, pre_copy, post_copy)
     verify(cfg)
 
 